@@ -0,0 +1,37 @@
+"""Shorten a 100k-url batch through POST /api/shorturl/bulk.
+
+Run from the repository root: python -m benchmarks.bench_bulk
+"""
+import json
+import tempfile
+import time
+
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel, create_engine
+
+import main
+
+
+def run(size=100_000):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db")
+        SQLModel.metadata.create_all(engine)
+        main.engine = engine
+        client = TestClient(main.app)
+
+        # A quarter of the batch repeats earlier entries
+        urls = [f"https://example.com/campaign/{i % (size * 3 // 4)}?utm_source=mail" for i in range(size)]
+        for label, headers, body in (
+            ("json, new", {"Content-Type": "application/json"}, json.dumps(urls)),
+            ("json, existing", {"Content-Type": "application/json"}, json.dumps(urls)),
+            ("ndjson, existing", {"Content-Type": "application/x-ndjson"}, "\n".join(urls)),
+        ):
+            start = time.perf_counter()
+            response = client.post("/api/shorturl/bulk", headers=headers, data=body)
+            elapsed = time.perf_counter() - start
+            assert response.ok
+            print(f"{label:<18}{size} urls {elapsed:6.2f} s")
+
+
+if __name__ == "__main__":
+    run()
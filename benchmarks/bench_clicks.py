@@ -0,0 +1,66 @@
+"""Redirect latency with and without click counting.
+
+Run from the repository root: python -m benchmarks.bench_clicks
+"""
+import tempfile
+import time
+import timeit
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel, create_engine
+
+import main
+from helpers.clicks import ClickCounter
+from models import Url
+
+
+class NoopCounter(ClickCounter):
+    def record(self, short_url, referrer=None):
+        pass
+
+
+def time_redirects(client, codes):
+    start = time.perf_counter()
+    for code in codes:
+        client.get(f"/api/shorturl/{code}", allow_redirects=False)
+    return (time.perf_counter() - start) / len(codes)
+
+
+def run(urls=1000, requests=3000):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db")
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            for i in range(1, urls + 1):
+                session.add(Url(short_url=i, original_url=f"https://example.com/{i}"))
+            session.commit()
+        main.engine = engine
+        client = TestClient(main.app)
+        codes = [i % urls + 1 for i in range(requests)]
+
+        # Alternate the two modes so machine noise hits both alike
+        noop, counter = NoopCounter(engine), ClickCounter(engine)
+        uncounted = counted = float("inf")
+        for _ in range(5):
+            main.clicks = noop
+            uncounted = min(uncounted, time_redirects(client, codes))
+            main.clicks = counter
+            counted = min(counted, time_redirects(client, codes))
+
+        start = time.perf_counter()
+        rows = main.clicks.flush()
+        flushed = time.perf_counter() - start
+
+        counter = ClickCounter(engine)
+        record = timeit.timeit(
+            lambda: counter.record(42, "https://www.freecodecamp.org/learn"), number=100_000
+        ) / 100_000
+
+    print(f"redirect, uncounted   {uncounted * 1e6:9.1f} us")
+    print(f"redirect, counted     {counted * 1e6:9.1f} us  ({100 * (counted / uncounted - 1):+.1f}%)")
+    print(f"ClickCounter.record   {record * 1e6:9.2f} us")
+    print(f"flush of {rows} counters {flushed * 1e3:8.1f} ms")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,61 @@
+"""Bytes on the wire for the large JSON endpoints, per content coding.
+
+Run from the repository root: python -m benchmarks.bench_compression
+"""
+import tempfile
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel, create_engine
+
+import main
+from models import Exercise, Hero, User
+
+
+def seed(engine, users=2000, exercises=2000, heroes=2000):
+    with Session(engine) as session:
+        for i in range(users):
+            session.add(User(username=f"fcc_test_{i:06d}"))
+        session.commit()
+        for i in range(exercises):
+            session.add(
+                Exercise(
+                    description=f"run {i % 7} km",
+                    duration=30 + i % 60,
+                    date="Mon Jan 01 1990",
+                    user_id=1,
+                )
+            )
+        for i in range(heroes):
+            session.add(Hero(name=f"Hero {i}", secret_name=f"Secret {i}", age=20 + i % 50))
+        session.commit()
+
+
+def wire_size(client, path, encoding):
+    response = client.get(path, headers={"Accept-Encoding": encoding})
+    return int(response.headers["content-length"]), response.headers.get(
+        "content-encoding", "identity"
+    )
+
+
+def run():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db")
+        SQLModel.metadata.create_all(engine)
+        seed(engine)
+        main.engine = engine
+        client = TestClient(main.app)
+
+        print(f"{'path':<22}{'coding':<10}{'bytes':>10}{'saved':>9}")
+        for path in ("/api/users", "/api/users/1/logs", "/heroes/"):
+            identity, _ = wire_size(client, path, "identity")
+            print(f"{path:<22}{'identity':<10}{identity:>10}{'':>9}")
+            for encoding in ("gzip", "br"):
+                size, coding = wire_size(client, path, encoding)
+                if coding != encoding:
+                    continue
+                saved = 100 * (1 - size / identity)
+                print(f"{path:<22}{coding:<10}{size:>10}{saved:>8.1f}%")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,67 @@
+"""Short url lookups: mmap snapshot vs SQLite.
+
+Run from the repository root: python -m benchmarks.bench_snapshot
+"""
+import random
+import tempfile
+import time
+import timeit
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from sqlmodel import Session, SQLModel, create_engine, select
+
+import edge
+import main
+from helpers.snapshot import Snapshot, SnapshotStore, export_snapshot
+from models import Url
+
+
+def per_call(function, codes):
+    elapsed = min(timeit.repeat(lambda: [function(code) for code in codes], number=1, repeat=5))
+    return elapsed / len(codes)
+
+
+def run(urls=1_000_000, lookups=20_000, requests=2000):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db")
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            rows = [
+                {"short_url": i, "original_url": f"https://example.com/{i}/{'x' * (i % 40)}"}
+                for i in range(1, urls + 1)
+            ]
+            for start in range(0, len(rows), 450):
+                session.execute(insert(Url).values(rows[start:start + 450]))
+            session.commit()
+
+        path = f"{tmp}/urls.snapshot"
+        start = time.perf_counter()
+        export_snapshot(engine, path)
+        print(f"export of {urls} urls  {time.perf_counter() - start:8.2f} s")
+
+        start = time.perf_counter()
+        Snapshot(path)
+        print(f"load + validate      {time.perf_counter() - start:8.2f} s  (reloads run in a thread)")
+
+        store = SnapshotStore(path)
+        codes = [random.randint(1, urls) for _ in range(lookups)]
+
+        def sqlite_lookup(code):
+            with Session(engine) as session:
+                return session.exec(select(Url.original_url).where(Url.short_url == code)).first()
+
+        print(f"sqlite lookup        {per_call(sqlite_lookup, codes) * 1e6:8.2f} us")
+        print(f"snapshot lookup      {per_call(store.lookup, codes) * 1e6:8.2f} us")
+
+        main.engine = engine
+        edge.snapshots = store
+        codes = codes[:requests]
+        for name, app in (("main.app redirect", main.app), ("edge.app redirect", edge.app)):
+            client = TestClient(app)
+            elapsed = per_call(lambda code: client.get(f"/api/shorturl/{code}", allow_redirects=False), codes)
+            print(f"{name:<21}{elapsed * 1e6:8.1f} us")
+
+
+if __name__ == "__main__":
+    run()
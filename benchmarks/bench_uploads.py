@@ -0,0 +1,116 @@
+"""Multipart upload throughput: streaming /api/fileanalyse vs UploadFile,
+and streaming with the upload written to a content store (UPLOAD_STORE).
+
+The request body is generated on the fly and fed to the ASGI apps directly,
+so no client or socket is involved.
+
+Run from the repository root: python -m benchmarks.bench_uploads [size_mb] [concurrency]
+"""
+import asyncio
+import hashlib
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from fastapi import FastAPI, UploadFile
+
+import main
+from helpers.filestore import ContentStore
+
+BOUNDARY = b"----benchboundary7MA4YWxkTrZu0gW"
+CHUNK = 64 * 1024
+
+
+def body_chunks(size):
+    yield (
+        b"--" + BOUNDARY + b"\r\n"
+        b'Content-Disposition: form-data; name="upfile"; filename="big.bin"\r\n'
+        b"Content-Type: application/octet-stream\r\n\r\n"
+    )
+    block = os.urandom(CHUNK)
+    for _ in range(size // CHUNK):
+        yield block
+    yield b"\r\n--" + BOUNDARY + b"--\r\n"
+
+
+async def upload(app, size):
+    chunks = body_chunks(size)
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/api/fileanalyse",
+        "raw_path": b"/api/fileanalyse",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"content-type", b"multipart/form-data; boundary=" + BOUNDARY),
+            (b"host", b"testserver"),
+        ],
+        "client": ("127.0.0.1", 1234),
+        "server": ("testserver", 80),
+    }
+
+    async def receive():
+        chunk = next(chunks, None)
+        await asyncio.sleep(0)
+        if chunk is None:
+            return {"type": "http.request", "body": b"", "more_body": False}
+        return {"type": "http.request", "body": chunk, "more_body": True}
+
+    response = []
+
+    async def send(message):
+        response.append(message)
+
+    await app(scope, receive, send)
+    assert response[0]["status"] == 200, response
+
+
+legacy = FastAPI()
+
+
+@legacy.post("/api/fileanalyse")
+async def legacy_upload(upfile: UploadFile):
+    # What analysing a spooled upload costs: read the temp file back to hash it
+    sha256 = hashlib.sha256()
+    while chunk := await upfile.read(1024 * 1024):
+        sha256.update(chunk)
+    return {"name": upfile.filename, "sha256": sha256.hexdigest()}
+
+
+async def measure(app, size, concurrency):
+    start = time.perf_counter()
+    await asyncio.gather(*(upload(app, size) for _ in range(concurrency)))
+    return time.perf_counter() - start
+
+
+def report(name, app, size, size_mb, concurrency):
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    elapsed = asyncio.run(measure(app, size, concurrency))
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    throughput = size * concurrency / elapsed / 1024 / 1024
+    print(
+        f"{name:<18}{concurrency} x {size_mb} MB  {elapsed:7.2f} s  {throughput:7.1f} MB/s"
+        f"  max rss +{(rss_after - rss_before) / 1024:.0f} MB"
+    )
+
+
+def run(size_mb=1024, concurrency=1):
+    size = size_mb * 1024 * 1024
+    report("UploadFile + hash", legacy, size, size_mb, concurrency)
+    report("streaming", main.app, size, size_mb, concurrency)
+    with tempfile.TemporaryDirectory(dir=".") as root:
+        main.file_store = ContentStore(root)
+        try:
+            report("streaming + store", main.app, size, size_mb, concurrency)
+        finally:
+            main.file_store = None
+
+
+if __name__ == "__main__":
+    run(*map(int, sys.argv[1:]))
@@ -0,0 +1,52 @@
+"""Cost of the whoami header parsing, cold and memoized.
+
+Run from the repository root: python -m benchmarks.bench_whoami
+"""
+import timeit
+
+from helpers.headers import client_ip, parse_accept_language, parse_networks, parse_user_agent
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36 Edg/118.0.2088.46",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Safari/605.1.15",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:109.0) Gecko/20100101 Firefox/119.0",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 16_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.5 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Linux; Android 13; SM-S908B) AppleWebKit/537.36 (KHTML, like Gecko) SamsungBrowser/22.0 Chrome/111.0.5563.116 Mobile Safari/537.36",
+    "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+    "curl/8.4.0",
+]
+ACCEPT_LANGUAGE = "fr-CH, fr;q=0.9, en;q=0.8, de;q=0.7, *;q=0.5"
+
+
+def per_call(function, number=20_000):
+    return min(timeit.repeat(function, number=number, repeat=5)) / number
+
+
+def run():
+    def cold():
+        parse_user_agent.cache_clear()
+        for user_agent in USER_AGENTS:
+            parse_user_agent(user_agent)
+
+    def warm():
+        for user_agent in USER_AGENTS:
+            parse_user_agent(user_agent)
+
+    print(f"parse_user_agent, cold      {per_call(cold, 2000) / len(USER_AGENTS) * 1e6:7.2f} us")
+    print(f"parse_user_agent, memoized  {per_call(warm) / len(USER_AGENTS) * 1e6:7.2f} us")
+
+    def cold_language():
+        parse_accept_language.cache_clear()
+        parse_accept_language(ACCEPT_LANGUAGE)
+
+    print(f"parse_accept_language, cold {per_call(cold_language) * 1e6:7.2f} us")
+    print(f"parse_accept_language, memo {per_call(lambda: parse_accept_language(ACCEPT_LANGUAGE)) * 1e6:7.2f} us")
+
+    trusted = parse_networks("10.0.0.0/8, 172.16.0.0/12")
+    forwarded_for = "203.0.113.7, 198.51.100.2, 10.1.2.3"
+    print(f"client_ip, 3 hops           {per_call(lambda: client_ip('10.0.0.1', forwarded_for, trusted)) * 1e6:7.2f} us")
+
+
+if __name__ == "__main__":
+    run()
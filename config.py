@@ -0,0 +1,34 @@
+import os
+
+# Response compression: "br" (falls back to gzip when brotli isn't installed), "gzip" or "off"
+compression = os.getenv("COMPRESSION", "br")
+compression_minimum_size = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "500"))
+gzip_level = int(os.getenv("GZIP_LEVEL", "6"))
+brotli_quality = int(os.getenv("BROTLI_QUALITY", "4"))
+
+# Short links never change once created, so 301 + immutable is safe to opt into
+shorturl_redirect_status = int(os.getenv("SHORTURL_REDIRECT_STATUS", "303"))
+shorturl_cache_max_age = int(os.getenv("SHORTURL_CACHE_MAX_AGE", "3600"))
+
+# Buffered short url click counts are written to the database this often (seconds)
+click_flush_interval = float(os.getenv("CLICK_FLUSH_INTERVAL", "10"))
+# Distinct Referer hosts counted per short url and hour; the rest count as "other"
+click_max_referrers = int(os.getenv("CLICK_MAX_REFERRERS", "50"))
+
+# Snapshot file served by edge.py, and how often to check it for a new version (seconds)
+shorturl_snapshot = os.getenv("SHORTURL_SNAPSHOT", "urls.snapshot")
+shorturl_snapshot_check_interval = float(os.getenv("SHORTURL_SNAPSHOT_CHECK_INTERVAL", "1"))
+
+# Admin token for /admin/profile; profiling is not installed at all when unset
+profiling_token = os.getenv("PROFILING_TOKEN", "")
+
+# Bytes all in-flight /api/fileanalyse uploads may hold at once, and the share
+# each upload reserves; uploads beyond the budget wait for a free slot
+upload_memory_budget = int(os.getenv("UPLOAD_MEMORY_BUDGET", str(64 * 1024 * 1024)))
+upload_window = int(os.getenv("UPLOAD_WINDOW", str(1024 * 1024)))
+
+# Directory /api/fileanalyse stores uploads in, by SHA-256; uploads are discarded when unset
+upload_store = os.getenv("UPLOAD_STORE", "")
+
+# Comma-separated proxy addresses/networks whose X-Forwarded-For is believed
+trusted_proxies = os.getenv("TRUSTED_PROXIES", "")
@@ -0,0 +1,36 @@
+import config
+from helpers.http_cache import redirect_cache_control
+from helpers.snapshot import SnapshotStore
+from uvicorn import run
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, RedirectResponse
+
+# Redirect-only app for edge nodes: resolves short urls from a snapshot
+# exported with `python -m helpers.snapshot`, without touching the database.
+app = FastAPI()
+snapshots: SnapshotStore | None = None
+cache_control = redirect_cache_control(
+  config.shorturl_redirect_status, config.shorturl_cache_max_age
+)
+
+@app.on_event("startup")
+def on_startup():
+  global snapshots
+  snapshots = SnapshotStore(
+    config.shorturl_snapshot, interval=config.shorturl_snapshot_check_interval
+  )
+
+@app.get('/api/shorturl/{id}')
+async def get_shorturl(id: int):
+  original_url = snapshots.lookup(id) if id >= 0 else None
+  if original_url is None:
+    return JSONResponse({"error": "No short URL found for the given input"}, status_code=404)
+  return RedirectResponse(
+    original_url,
+    status_code=config.shorturl_redirect_status,
+    headers={"Cache-Control": cache_control},
+  )
+
+
+if __name__ == '__main__':
+  run("edge:app")
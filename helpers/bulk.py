@@ -0,0 +1,39 @@
+import json
+
+# Results are encoded and sent this many at a time
+STREAM_CHUNK = 1000
+
+
+def parse_ndjson(body: bytes) -> list:
+    # Each line is a JSON value, or a bare url for hand-written files
+    items = []
+    for line in body.decode().splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        items.append(json.loads(line) if line[0] in "\"{[" else line)
+    return items
+
+
+def chunked(results, size=STREAM_CHUNK):
+    chunk = []
+    for result in results:
+        chunk.append(json.dumps(result))
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stream_ndjson(results):
+    for chunk in chunked(results):
+        yield ("\n".join(chunk) + "\n").encode()
+
+
+def stream_json_array(results):
+    separator = "["
+    for chunk in chunked(results):
+        yield (separator + ",".join(chunk)).encode()
+        separator = ","
+    yield b"]" if separator == "," else b"[]"
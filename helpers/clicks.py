@@ -0,0 +1,131 @@
+import asyncio
+import time
+from collections import Counter
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, select
+from starlette.concurrency import run_in_threadpool
+
+from models import UrlClick
+
+# Referrer hosts come from the client, so each short url gets this many
+# distinct ones per hour and the rest are counted under OTHER_REFERRER
+MAX_REFERRERS = 50
+OTHER_REFERRER = "other"
+
+
+@lru_cache(maxsize=4096)
+def referrer_host(referrer: str | None) -> str:
+    # Keep only the host: paths and query strings would split one site
+    if not referrer:
+        return ""
+    try:
+        return urlsplit(referrer).hostname or ""
+    except ValueError:
+        return ""
+
+
+class ClickCounter:
+    """Buffers short url clicks in memory and flushes them in batches.
+
+    ``record`` is a single dict increment so the redirect path never touches
+    the database; ``flush`` folds the buffered counts into ``UrlClick`` rows
+    with one multi-row upsert.
+    """
+
+    def __init__(self, engine, interval: float = 10, max_referrers: int = MAX_REFERRERS):
+        self.engine = engine
+        self.interval = interval
+        self.max_referrers = max_referrers
+        self.pending: Counter = Counter()
+        # Referrer hosts given a bucket of their own this hour, per short url
+        self.hour = 0
+        self.referrers: dict[int, set] = {}
+        self.task: asyncio.Task | None = None
+
+    def record(self, short_url: int, referrer: str | None = None):
+        hour = int(time.time()) // 3600 * 3600
+        if hour != self.hour:
+            self.hour = hour
+            self.referrers.clear()
+        host = referrer_host(referrer)
+        seen = self.referrers.setdefault(short_url, set())
+        if host not in seen:
+            if len(seen) >= self.max_referrers:
+                host = OTHER_REFERRER
+            else:
+                seen.add(host)
+        self.pending[(short_url, hour, host)] += 1
+
+    def write(self, counts: Counter):
+        rows = [
+            {"short_url": short_url, "hour": hour, "referrer": referrer, "clicks": clicks}
+            for (short_url, hour, referrer), clicks in counts.items()
+        ]
+        with Session(self.engine) as session:
+            # Stay well below SQLite's bound parameter limit
+            for start in range(0, len(rows), 200):
+                statement = insert(UrlClick).values(rows[start:start + 200])
+                statement = statement.on_conflict_do_update(
+                    index_elements=["short_url", "hour", "referrer"],
+                    set_={"clicks": UrlClick.clicks + statement.excluded.clicks},
+                )
+                session.exec(statement)
+            session.commit()
+
+    def flush(self):
+        pending, self.pending = self.pending, Counter()
+        if not pending:
+            return 0
+        try:
+            self.write(pending)
+        except Exception:
+            # Put the counts back so they go out with the next flush
+            self.pending.update(pending)
+            raise
+        return len(pending)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            pending, self.pending = self.pending, Counter()
+            if not pending:
+                continue
+            try:
+                await run_in_threadpool(self.write, pending)
+            except Exception:
+                self.pending.update(pending)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        self.flush()
+
+    def stats(self, short_url: int):
+        hourly: Counter = Counter()
+        referrers: Counter = Counter()
+        with Session(self.engine) as session:
+            rows = session.exec(select(UrlClick).where(UrlClick.short_url == short_url)).all()
+            for row in rows:
+                hourly[row.hour] += row.clicks
+                referrers[row.referrer] += row.clicks
+        for (code, hour, referrer), clicks in list(self.pending.items()):
+            if code == short_url:
+                hourly[hour] += clicks
+                referrers[referrer] += clicks
+        return {
+            "short_url": short_url,
+            "clicks": sum(hourly.values()),
+            "referrers": {referrer or "direct": clicks for referrer, clicks in referrers.most_common()},
+            "hourly": {
+                time.strftime("%Y-%m-%dT%H:00:00Z", time.gmtime(hour)): clicks
+                for hour, clicks in sorted(hourly.items())
+            },
+        }
@@ -0,0 +1,162 @@
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+
+class GzipEncoder:
+    name = "gzip"
+
+    def __init__(self, level: int = 6):
+        # wbits=31 makes zlib write a gzip header and trailer
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def process(self, data: bytes) -> bytes:
+        return self.compressor.compress(data)
+
+    def finish(self) -> bytes:
+        return self.compressor.flush()
+
+
+class BrotliEncoder:
+    name = "br"
+
+    def __init__(self, quality: int = 4):
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def process(self, data: bytes) -> bytes:
+        return self.compressor.process(data)
+
+    def finish(self) -> bytes:
+        return self.compressor.finish()
+
+
+def accepted_encodings(accept_encoding: str) -> set[str]:
+    encodings = set()
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        encodings.add(coding.strip().lower())
+    return encodings
+
+
+class CompressionMiddleware:
+    """Gzip/brotli response compression.
+
+    Works like starlette's GZipMiddleware, but negotiates brotli when the
+    client accepts it and the ``brotli`` package is installed.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 500,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        prefer_brotli: bool = True,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.prefer_brotli = prefer_brotli and brotli is not None
+
+    def select_encoder(self, headers: Headers):
+        encodings = accepted_encodings(headers.get("accept-encoding", ""))
+        if self.prefer_brotli and "br" in encodings:
+            return BrotliEncoder(self.brotli_quality)
+        if "gzip" in encodings:
+            return GzipEncoder(self.gzip_level)
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            encoder = self.select_encoder(Headers(scope=scope))
+            if encoder is not None:
+                responder = CompressionResponder(self.app, self.minimum_size, encoder)
+                await responder(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+class CompressionResponder:
+    def __init__(self, app: ASGIApp, minimum_size: int, encoder) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encoder = encoder
+        self.initial_message: Message = {}
+        self.started = False
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            if "content-range" in headers or "accept-ranges" in headers:
+                # Byte ranges refer to the identity encoding; leave these alone
+                self.started = self.passthrough = True
+                await self.send(message)
+                return
+            # Hold the start message until we know whether the body gets encoded
+            self.initial_message = message
+            return
+        if message_type != "http.response.body":
+            if not self.started:
+                self.started = self.passthrough = True
+                await self.send(self.initial_message)
+            await self.send(message)
+            return
+
+        if not self.started:
+            self.started = True
+            headers = MutableHeaders(raw=self.initial_message["headers"])
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if "content-encoding" in headers or (
+                len(body) < self.minimum_size and not more_body
+            ):
+                self.passthrough = True
+                await self.send(self.initial_message)
+                await self.send(message)
+                return
+
+            headers["Content-Encoding"] = self.encoder.name
+            headers.add_vary_header("Accept-Encoding")
+            if "etag" in headers and not headers["etag"].startswith("W/"):
+                # The encoded representation is no longer byte-identical
+                headers["ETag"] = "W/" + headers["etag"]
+
+            body = self.encoder.process(body)
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                body += self.encoder.finish()
+                headers["Content-Length"] = str(len(body))
+            message["body"] = body
+
+            await self.send(self.initial_message)
+            await self.send(message)
+        elif self.passthrough:
+            await self.send(message)
+        else:
+            body = self.encoder.process(message.get("body", b""))
+            if not message.get("more_body", False):
+                body += self.encoder.finish()
+            message["body"] = body
+            await self.send(message)
@@ -0,0 +1,196 @@
+import os
+import re
+import tempfile
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.types import Receive, Scope, Send
+
+from helpers.uploads import FileAnalysis, UploadError
+
+SHA256_HEX = re.compile(r"[0-9a-f]{64}")
+RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+# Bytes an upload collects before handing them to a worker thread to write;
+# the same as the default UPLOAD_WINDOW each upload reserves
+WRITE_BATCH = 1024 * 1024
+
+
+class ContentStore:
+    """Uploaded files stored once per content, under their SHA-256.
+
+    Uploads are written to ``tmp/`` and hard-linked into place, so a blob
+    path only ever appears complete, and two uploads of the same bytes racing
+    each other end up sharing one inode.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.tmp = os.path.join(root, "tmp")
+        os.makedirs(self.tmp, exist_ok=True)
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def exists(self, sha256: str) -> bool:
+        return os.path.exists(self.path(sha256))
+
+    def open_upload(self, filename: str, content_type: str, expected_sha256: str | None = None):
+        return StoredFile(self, filename, content_type, expected_sha256)
+
+
+class StoredFile(FileAnalysis):
+    """Analyses an upload and writes it to the store's ``tmp/``. Chunks are
+    collected and written in batches off the event loop by ``flush``."""
+
+    def __init__(self, store: ContentStore, filename: str, content_type: str, expected_sha256=None):
+        super().__init__(filename, content_type)
+        self.store = store
+        expected_sha256 = (expected_sha256 or "").lower()
+        self.expected_sha256 = expected_sha256 if SHA256_HEX.fullmatch(expected_sha256) else None
+        # The client told us the digest and we already have it: hash the rest
+        # of the body to verify the claim, but don't write it anywhere
+        self.duplicate = self.expected_sha256 is not None and store.exists(self.expected_sha256)
+        self.file = None
+        self.pending = []
+        self.pending_size = 0
+        if not self.duplicate:
+            self.file = tempfile.NamedTemporaryFile(dir=store.tmp, delete=False)
+
+    def write(self, data):
+        super().write(data)
+        if self.file is not None:
+            self.pending.append(data)
+            self.pending_size += len(data)
+
+    async def flush(self, final: bool = False):
+        if not self.pending or (not final and self.pending_size < WRITE_BATCH):
+            return
+        pending, self.pending, self.pending_size = self.pending, [], 0
+        await anyio.to_thread.run_sync(self.file.writelines, pending)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+    def discard(self):
+        self.pending, self.pending_size = [], 0
+        if self.file is not None:
+            self.file.close()
+            try:
+                os.unlink(self.file.name)
+            except FileNotFoundError:
+                pass
+
+    def commit(self) -> str:
+        sha256 = self.sha256.hexdigest()
+        if self.expected_sha256 is not None and sha256 != self.expected_sha256:
+            self.discard()
+            raise UploadError("upload does not match X-Content-SHA256")
+        if self.file is None:
+            return sha256
+
+        path = self.store.path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.link(self.file.name, path)
+        except FileExistsError:
+            self.duplicate = True
+        finally:
+            os.unlink(self.file.name)
+        return sha256
+
+
+def parse_range(range_header: str, size: int):
+    """Return (start, end) inclusive for a single "bytes=" range, None to
+    serve the whole file, or raise ValueError if it can't be satisfied."""
+    match = RANGE.fullmatch(range_header.strip())
+    if match is None:
+        # Multiple ranges or other units: sending the whole file is allowed
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        raise ValueError(range_header)
+    return start, end
+
+
+class RangeFileResponse(FileResponse):
+    """FileResponse with single byte-range support that hands the file to the
+    server through the ASGI zero-copy extension (sendfile) when offered."""
+
+    def __init__(self, path, *args, **kwargs):
+        super().__init__(path, *args, **kwargs)
+        self.headers["accept-ranges"] = "bytes"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        stat_result = self.stat_result or await anyio.to_thread.run_sync(os.stat, self.path)
+        self.set_stat_headers(stat_result)
+        size = stat_result.st_size
+        start, end = 0, size - 1
+
+        request_headers = Headers(scope=scope)
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if range_header and (if_range is None or if_range == self.headers.get("etag")):
+            try:
+                byte_range = parse_range(range_header, size)
+            except ValueError:
+                await send(
+                    {
+                        "type": "http.response.start",
+                        "status": 416,
+                        "headers": [(b"content-range", f"bytes */{size}".encode())],
+                    }
+                )
+                await send({"type": "http.response.body", "body": b""})
+                return
+            if byte_range is not None:
+                start, end = byte_range
+                self.status_code = 206
+                self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+                self.headers["content-length"] = str(end - start + 1)
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        count = end - start + 1
+        if self.send_header_only or count <= 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        with open(self.path, "rb") as file:
+            if "http.response.zerocopy" in scope.get("extensions", {}):
+                await send(
+                    {
+                        "type": "http.response.zerocopy",
+                        "file": file,
+                        "offset": start,
+                        "count": count,
+                    }
+                )
+                return
+            offset = start
+            while count > 0:
+                chunk = await anyio.to_thread.run_sync(
+                    os.pread, file.fileno(), min(self.chunk_size, count), offset
+                )
+                if not chunk:
+                    # The file shrank under us; end the body where it stops
+                    await send({"type": "http.response.body", "body": b""})
+                    break
+                offset += len(chunk)
+                count -= len(chunk)
+                await send(
+                    {"type": "http.response.body", "body": chunk, "more_body": count > 0}
+                )
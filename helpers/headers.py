@@ -0,0 +1,163 @@
+import ipaddress
+import re
+from functools import lru_cache
+
+MAX_LANGUAGES = 20
+# Real User-Agents are a few hundred characters; the rest is not parsed
+MAX_USER_AGENT = 512
+
+BOT_KEYWORDS = ("bot", "spider", "crawler")
+BOT_VERSION = re.compile(r"/([\d.]+)")
+# Order matters: most browsers also claim to be the ones further down
+BROWSERS = [
+    ("Edge", re.compile(r"Edg(?:e|A|iOS)?/([\d.]+)")),
+    ("Opera", re.compile(r"(?:OPR|Opera)/([\d.]+)")),
+    ("Samsung Internet", re.compile(r"SamsungBrowser/([\d.]+)")),
+    ("Firefox", re.compile(r"(?:Firefox|FxiOS)/([\d.]+)")),
+    ("Chrome", re.compile(r"(?:Chrome|CriOS)/([\d.]+)")),
+    ("Safari", re.compile(r"Version/([\d.]+).*Safari/")),
+    ("Internet Explorer", re.compile(r"(?:MSIE |Trident/.*rv:)([\d.]+)")),
+    ("curl", re.compile(r"^curl/([\d.]+)")),
+]
+OPERATING_SYSTEMS = [
+    ("iOS", re.compile(r"(?:iPhone|CPU) OS (\d+(?:_\d+)*)")),
+    ("Android", re.compile(r"Android (\d+(?:\.\d+)*)")),
+    ("Chrome OS", re.compile(r"CrOS \S+ ([\d.]+)")),
+    ("Windows", re.compile(r"Windows NT (\d+\.\d+)")),
+    ("macOS", re.compile(r"Mac OS X (\d+(?:[_.]\d+)*)")),
+    ("Linux", re.compile(r"Linux")),
+]
+WINDOWS_VERSIONS = {"10.0": "10", "6.3": "8.1", "6.2": "8", "6.1": "7", "6.0": "Vista", "5.1": "XP"}
+
+
+def is_name_char(char: str) -> bool:
+    return char.isalnum() or char in "_-"
+
+
+def find_bot(user_agent: str):
+    """Name and version of the bot a User-Agent declares, e.g. "Googlebot"
+    and "2.1", or None. The first word containing a bot keyword is taken.
+
+    Found with ``str.find`` and widened to the word by hand: a regex with
+    unbounded runs around the keyword backtracks quadratically on long words.
+    """
+    lowered = user_agent.lower()
+    positions = [pos for pos in map(lowered.find, BOT_KEYWORDS) if pos != -1]
+    if not positions:
+        return None
+    start = end = min(positions)
+    while start > 0 and is_name_char(user_agent[start - 1]):
+        start -= 1
+    while end < len(user_agent) and is_name_char(user_agent[end]):
+        end += 1
+    version = BOT_VERSION.match(user_agent, end)
+    return user_agent[start:end], version.group(1) if version else None
+
+
+@lru_cache(maxsize=1024)
+def parse_user_agent(user_agent: str) -> dict:
+    """Browser family/version, OS and device class of a User-Agent string.
+
+    Memoized: the same few hundred strings make up nearly all traffic. The
+    returned dict is shared between callers and must not be modified. Only
+    the first ``MAX_USER_AGENT`` characters are looked at; callers should cut
+    longer strings before calling so they don't end up as cache keys.
+    """
+    family, version, bot = "Other", None, False
+    user_agent = user_agent[:MAX_USER_AGENT]
+    found = find_bot(user_agent)
+    if found:
+        (family, version), bot = found, True
+    else:
+        for name, pattern in BROWSERS:
+            match = pattern.search(user_agent)
+            if match:
+                family, version = name, match.group(1)
+                break
+
+    os_family, os_version = "Other", None
+    for name, pattern in OPERATING_SYSTEMS:
+        match = pattern.search(user_agent)
+        if match:
+            os_family = name
+            os_version = match.group(1).replace("_", ".") if pattern.groups else None
+            if name == "Windows":
+                os_version = WINDOWS_VERSIONS.get(os_version, os_version)
+            break
+
+    if bot:
+        device = "bot"
+    elif "iPad" in user_agent or (os_family == "Android" and "Mobile" not in user_agent):
+        device = "tablet"
+    elif "Mobi" in user_agent or "iPhone" in user_agent:
+        device = "mobile"
+    elif os_family == "Other":
+        device = "other"
+    else:
+        device = "desktop"
+
+    return {
+        "family": family,
+        "version": version,
+        "os": os_family,
+        "os_version": os_version,
+        "device": device,
+    }
+
+
+@lru_cache(maxsize=1024)
+def parse_accept_language(accept_language: str) -> tuple:
+    """Language tags by preference, highest q first; q=0 entries dropped."""
+    languages = []
+    for position, part in enumerate(accept_language.split(",")[:MAX_LANGUAGES]):
+        tag, _, params = part.partition(";")
+        tag = tag.strip()
+        if not tag:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                continue
+        if not 0 < q <= 1:
+            continue
+        languages.append((-q, position, tag))
+    return tuple({"tag": tag, "q": -q} for q, _, tag in sorted(languages))
+
+
+def parse_networks(value: str) -> tuple:
+    return tuple(
+        ipaddress.ip_network(item.strip(), strict=False) for item in value.split(",") if item.strip()
+    )
+
+
+@lru_cache(maxsize=1024)
+def canonical_ip(address: str) -> str | None:
+    try:
+        return str(ipaddress.ip_address(address))
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=1024)
+def is_trusted(address: str, networks: tuple) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in networks)
+
+
+def client_ip(peer: str, forwarded_for: str | None, trusted_proxies: tuple) -> str:
+    """The client address, taken from X-Forwarded-For when the request came
+    through trusted proxies: the rightmost address that isn't one of them."""
+    if not forwarded_for or not trusted_proxies or not is_trusted(peer, trusted_proxies):
+        return peer
+    for hop in reversed(forwarded_for.split(",")):
+        hop = hop.strip()
+        if is_trusted(hop, trusted_proxies):
+            continue
+        return canonical_ip(hop) or peer
+    return peer
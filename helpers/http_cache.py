@@ -0,0 +1,90 @@
+import hashlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+def make_etag(body: bytes) -> str:
+    return 'W/"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison (RFC 9110 13.1.2): the W/ prefix is ignored
+    opaque = etag.removeprefix("W/")
+    return any(
+        tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(",")
+    )
+
+
+def redirect_cache_control(status_code: int, max_age: int) -> str:
+    if status_code in (301, 308):
+        return f"public, max-age={max_age}, immutable"
+    return f"public, max-age={max_age}"
+
+
+class ETagMiddleware:
+    """Adds an ETag to buffered 200 responses of GET/HEAD requests and answers
+    ``If-None-Match`` revalidations with 304 Not Modified.
+
+    Streaming responses pass through untouched.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        initial_message: Message = {}
+        started = False
+
+        async def send_with_etag(message: Message) -> None:
+            nonlocal initial_message, started
+            if message["type"] == "http.response.start":
+                initial_message = message
+                return
+            if started:
+                await send(message)
+                return
+            started = True
+            if message["type"] != "http.response.body":
+                await send(initial_message)
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=initial_message["headers"])
+            if (
+                initial_message["status"] != 200
+                or message.get("more_body", False)
+                or "etag" in headers
+            ):
+                await send(initial_message)
+                await send(message)
+                return
+
+            etag = make_etag(message.get("body", b""))
+            headers["ETag"] = etag
+            if if_none_match is not None and etag_matches(if_none_match, etag):
+                not_modified = MutableHeaders()
+                for name in ("etag", "cache-control", "vary", "content-location"):
+                    if name in headers:
+                        not_modified[name] = headers[name]
+                await send(
+                    {
+                        "type": "http.response.start",
+                        "status": 304,
+                        "headers": not_modified.raw,
+                    }
+                )
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+            await send(initial_message)
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
@@ -0,0 +1,189 @@
+"""On-demand profiling for a running app.
+
+Nothing here is installed unless ``PROFILING_TOKEN`` is set, so a disabled
+app pays nothing. When enabled, admins can:
+
+* profile the next N requests of one route with cProfile and read the
+  pstats report, and
+* sample every thread's stack for a few seconds and get collapsed stacks
+  (``frame;frame;frame count`` lines, the input format of flamegraph.pl and
+  speedscope).
+
+cProfile only sees the event loop thread, so routes declared with plain
+``def`` (run in the threadpool) are better looked at with the sampler. The
+profiler is switched on only while the profiled request's own coroutine is
+running and off whenever it yields to the loop, so other requests served
+meanwhile are not charged to the route; time spent waiting shows up in
+neither.
+"""
+import cProfile
+import io
+import os
+import pstats
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Match
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+MAX_SAMPLE_SECONDS = 60
+
+
+class RouteProfiler:
+    def __init__(self):
+        self.routes = []
+        self.armed: dict[str, int] = {}
+        self.stats: dict[str, pstats.Stats] = {}
+        self.busy = False
+
+    def arm(self, path: str, requests: int):
+        self.armed[path] = requests
+        self.stats.pop(path, None)
+
+    def match(self, scope: Scope) -> str | None:
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path if route.path in self.armed else None
+        return None
+
+    def record(self, path: str, profile: cProfile.Profile):
+        if path in self.stats:
+            self.stats[path].add(profile)
+        else:
+            self.stats[path] = pstats.Stats(profile)
+        self.armed[path] -= 1
+        if self.armed[path] <= 0:
+            del self.armed[path]
+
+    def report(self, path: str, sort: str = "cumulative", limit: int = 50) -> str:
+        stream = io.StringIO()
+        stats = self.stats[path]
+        stats.stream = stream
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+class StepProfiled:
+    """Awaitable running ``coroutine`` with ``profile`` enabled only while
+    one of its steps executes, i.e. not while other tasks have the loop."""
+
+    def __init__(self, coroutine, profile: cProfile.Profile):
+        self.coroutine = coroutine
+        self.profile = profile
+
+    def __await__(self):
+        coroutine, profile = self.coroutine, self.profile
+        value, error = None, None
+        while True:
+            profile.enable()
+            try:
+                if error is None:
+                    future = coroutine.send(value)
+                else:
+                    future = coroutine.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                profile.disable()
+            try:
+                value, error = (yield future), None
+            except BaseException as exc:
+                value, error = None, exc
+
+
+class ProfilingMiddleware:
+    def __init__(self, app: ASGIApp, profiler: RouteProfiler) -> None:
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        profiler = self.profiler
+        if not profiler.armed or profiler.busy or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        path = profiler.match(scope)
+        if path is None:
+            await self.app(scope, receive, send)
+            return
+
+        # One profiled request at a time: cProfile hooks the whole thread
+        profiler.busy = True
+        profile = cProfile.Profile()
+        try:
+            await StepProfiled(self.app(scope, receive, send), profile)
+            profiler.record(path, profile)
+        finally:
+            profiler.busy = False
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> str:
+    """Sample all other threads' stacks and return them collapsed."""
+    me = threading.get_ident()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    stacks: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_name(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            stacks[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def make_router(profiler: RouteProfiler, token: str) -> APIRouter:
+    def require_admin(x_admin_token: str = Header(default="")):
+        if not secrets.compare_digest(x_admin_token.encode(), token.encode()):
+            raise HTTPException(status_code=403, detail="admin token required")
+
+    router = APIRouter(prefix="/admin/profile", dependencies=[Depends(require_admin)])
+    sampling = threading.Lock()
+
+    @router.post("/route")
+    async def profile_route(path: str, requests: int = 1):
+        if path not in {route.path for route in profiler.routes}:
+            raise HTTPException(status_code=404, detail=f"no route {path}")
+        profiler.arm(path, max(requests, 1))
+        return {"path": path, "requests": max(requests, 1)}
+
+    @router.get("/route")
+    async def read_route_profile(path: str, sort: str = "cumulative", limit: int = 50):
+        if path in profiler.armed:
+            return {"path": path, "remaining": profiler.armed[path]}
+        if path not in profiler.stats:
+            raise HTTPException(status_code=404, detail=f"{path} has not been profiled")
+        try:
+            return PlainTextResponse(profiler.report(path, sort, limit))
+        except KeyError:
+            raise HTTPException(status_code=400, detail=f"unknown sort key {sort}")
+
+    @router.get("/sample")
+    async def sample(seconds: float = 5, interval: float = 0.005):
+        if not 0 < seconds <= MAX_SAMPLE_SECONDS or interval <= 0:
+            raise HTTPException(status_code=400, detail="invalid seconds or interval")
+        if not sampling.acquire(blocking=False):
+            raise HTTPException(status_code=409, detail="a sample is already running")
+        try:
+            stacks = await run_in_threadpool(sample_stacks, seconds, interval)
+        finally:
+            sampling.release()
+        return PlainTextResponse(stacks)
+
+    return router
@@ -0,0 +1,84 @@
+import threading
+import time
+
+from sqlalchemy import Column, MetaData, String, Table, func, insert
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlmodel import Session, select
+
+from models import Url
+
+# 2 bound parameters per row keeps each INSERT under SQLite's 999 limit
+INSERT_CHUNK = 450
+# Allocating ids reads max() and then inserts, so only one thread does it at a
+# time; other writers (click flushes, other processes) are retried
+allocation_lock = threading.Lock()
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 0.05
+
+batch_urls = Table(
+    "batch_url",
+    MetaData(),
+    Column("original_url", String, primary_key=True),
+    prefixes=["TEMPORARY"],
+)
+
+
+def existing_short_urls(session: Session, urls: list[str]) -> dict[str, int]:
+    """Look up which ``urls`` are already shortened with a single join
+    against a temporary table, instead of one query (or IN list) per chunk.
+    """
+    connection = session.connection()
+    batch_urls.create(connection, checkfirst=True)
+    connection.execute(batch_urls.delete())
+    connection.execute(batch_urls.insert(), [{"original_url": url} for url in urls])
+    rows = connection.execute(
+        select(Url.original_url, Url.short_url).join(
+            batch_urls, batch_urls.c.original_url == Url.original_url
+        )
+    )
+    found = dict(rows.all())
+    connection.execute(batch_urls.delete())
+    return found
+
+
+def shorten_urls(session: Session, urls: list[str]) -> dict[str, int]:
+    """Return a short url for every (already normalized) url, allocating
+    consecutive ids for the ones that are new. The caller commits.
+    """
+    unique_urls = list(dict.fromkeys(urls))
+    if not unique_urls:
+        return {}
+    short_urls = existing_short_urls(session, unique_urls)
+    new_urls = [url for url in unique_urls if url not in short_urls]
+    if not new_urls:
+        return short_urls
+
+    last_id = session.exec(select(func.max(Url.short_url))).one() or 0
+    rows = [
+        {"short_url": last_id + i, "original_url": url}
+        for i, url in enumerate(new_urls, start=1)
+    ]
+    connection = session.connection()
+    for start in range(0, len(rows), INSERT_CHUNK):
+        connection.execute(insert(Url).values(rows[start:start + INSERT_CHUNK]))
+    short_urls.update((row["original_url"], row["short_url"]) for row in rows)
+    return short_urls
+
+
+def shorten_and_commit(engine, urls: list[str]) -> dict[str, int]:
+    """``shorten_urls`` in a transaction of its own, committed.
+
+    Blocking: call it from the threadpool. A transaction that loses a race for
+    the SQLite write lock or for a short url id is rolled back and retried.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            with allocation_lock, Session(engine) as session:
+                short_urls = shorten_urls(session, urls)
+                session.commit()
+                return short_urls
+        except (IntegrityError, OperationalError) as error:
+            retryable = isinstance(error, IntegrityError) or "database is locked" in str(error)
+            if not retryable or attempt == MAX_ATTEMPTS - 1:
+                raise
+        time.sleep(RETRY_DELAY * 2 ** attempt)
@@ -0,0 +1,177 @@
+"""Read-only, memory-mapped snapshot of the ``Url`` table.
+
+Layout (little endian, so snapshots can be shipped between machines)::
+
+    magic   8 bytes   b"URLSNAP1"
+    count   uint64
+    ids     count * uint64           sorted short urls
+    offsets (count + 1) * uint64     url i is blob[offsets[i]:offsets[i + 1]]
+    blob    utf-8 original urls, back to back
+
+Export with ``python -m helpers.snapshot <path>``.
+"""
+import mmap
+import operator
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from sqlmodel import Session, select
+
+from models import Url
+
+MAGIC = b"URLSNAP1"
+HEADER = struct.Struct("<8sQ")
+LITTLE_ENDIAN = sys.byteorder == "little"
+# Elements compared per call when checking order; each call holds the GIL
+CHECK_CHUNK = 8192
+
+
+def is_increasing(values, strict: bool) -> bool:
+    """Whether ``values`` is sorted, compared element-wise against itself
+    shifted by one, a chunk at a time so other threads get to run."""
+    compare = operator.lt if strict else operator.le
+    for start in range(0, len(values) - 1, CHECK_CHUNK):
+        end = min(start + CHECK_CHUNK, len(values) - 1)
+        if not all(map(compare, values[start:end], values[start + 1:end + 1])):
+            return False
+    return True
+
+
+def export_snapshot(engine, path: str) -> int:
+    with Session(engine) as session:
+        rows = session.exec(
+            select(Url.short_url, Url.original_url).order_by(Url.short_url)
+        ).all()
+
+    ids, offsets, blob = [], [0], bytearray()
+    for short_url, original_url in rows:
+        if ids and ids[-1] == short_url:
+            continue
+        ids.append(short_url)
+        blob += original_url.encode()
+        offsets.append(len(blob))
+
+    # Write next to the target and rename, so readers never see a partial file
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".snapshot-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(ids)))
+            for values in (array("Q", ids), array("Q", offsets)):
+                if not LITTLE_ENDIAN:
+                    values.byteswap()
+                f.write(values.tobytes())
+            f.write(blob)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(ids)
+
+
+class Snapshot:
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self.version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        size = len(self.map)
+        if size < HEADER.size:
+            raise ValueError(f"{path} is too short to be a url snapshot")
+        magic, count = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a url snapshot")
+        ids_start = HEADER.size
+        offsets_start = ids_start + count * 8
+        blob_start = offsets_start + (count + 1) * 8
+        if blob_start > size:
+            raise ValueError(f"{path} is truncated: header says {count} urls")
+
+        view = memoryview(self.map)
+        if LITTLE_ENDIAN:
+            # Casts are views into the map: lookups never copy the index
+            self.ids = view[ids_start:offsets_start].cast("Q")
+            self.offsets = view[offsets_start:blob_start].cast("Q")
+        else:
+            self.ids, self.offsets = array("Q"), array("Q")
+            self.ids.frombytes(view[ids_start:offsets_start])
+            self.offsets.frombytes(view[offsets_start:blob_start])
+            self.ids.byteswap()
+            self.offsets.byteswap()
+        self.blob = view[blob_start:]
+        self.count = count
+
+        offsets = self.offsets
+        if offsets[0] != 0 or blob_start + offsets[count] != size:
+            raise ValueError(f"{path} is truncated or has trailing data")
+        if not is_increasing(offsets, strict=False) or not is_increasing(self.ids, strict=True):
+            raise ValueError(f"{path} has an unsorted index")
+
+    def __len__(self):
+        return self.count
+
+    def lookup(self, short_url: int) -> str | None:
+        i = bisect_left(self.ids, short_url)
+        if i == self.count or self.ids[i] != short_url:
+            return None
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], "utf-8", "replace")
+
+
+class SnapshotStore:
+    """Serves lookups from the current snapshot and swaps in a new one when
+    the file at ``path`` is replaced (checked at most every ``interval`` s).
+
+    The check, and loading a new snapshot, run in a background thread; until
+    it is done lookups keep using the old one.
+    """
+
+    def __init__(self, path: str, interval: float = 1):
+        self.path = path
+        self.interval = interval
+        self.snapshot = Snapshot(path)
+        self.checked_at = time.monotonic()
+        self.reloader: threading.Thread | None = None
+
+    def reload_if_changed(self):
+        self.checked_at = time.monotonic()
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        if (stat.st_ino, stat.st_mtime_ns, stat.st_size) == self.snapshot.version:
+            return False
+        try:
+            snapshot = Snapshot(self.path)
+        except (OSError, ValueError):
+            return False
+        # The old map stays alive until in-flight lookups drop their views
+        self.snapshot = snapshot
+        return True
+
+    def reload_in_background(self):
+        self.checked_at = time.monotonic()
+        if self.reloader is not None and self.reloader.is_alive():
+            return
+        self.reloader = threading.Thread(
+            target=self.reload_if_changed, name="snapshot-reload", daemon=True
+        )
+        self.reloader.start()
+
+    def lookup(self, short_url: int) -> str | None:
+        if time.monotonic() - self.checked_at >= self.interval:
+            self.reload_in_background()
+        return self.snapshot.lookup(short_url)
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "urls.snapshot"
+    print(f"exported {export_snapshot(engine, path)} urls to {path}")
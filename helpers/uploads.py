@@ -0,0 +1,219 @@
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+
+from multipart.multipart import parse_options_header
+
+SNIFF_SIZE = 512
+SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"%PDF-", "application/pdf"),
+    (b"PK\x03\x04", "application/zip"),
+    (b"\x1f\x8b", "application/gzip"),
+    (b"BZh", "application/x-bzip2"),
+    (b"\xfd7zXZ\x00", "application/x-xz"),
+    (b"7z\xbc\xaf\x27\x1c", "application/x-7z-compressed"),
+    (b"\x7fELF", "application/x-elf"),
+    (b"MZ", "application/x-msdownload"),
+    (b"ID3", "audio/mpeg"),
+    (b"OggS", "application/ogg"),
+    (b"\x1aE\xdf\xa3", "video/webm"),
+]
+
+
+class UploadError(Exception):
+    pass
+
+
+def sniff_type(head: bytes) -> str:
+    for signature, mime_type in SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp":
+        return "video/mp4"
+    if b"\x00" in head:
+        return "application/octet-stream"
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as error:
+        # A multi-byte character cut off at the end of the sniffed bytes is fine
+        if error.start < len(head) - 3:
+            return "application/octet-stream"
+    return "text/plain"
+
+
+class FileAnalysis:
+    """Size, SHA-256 and sniffed type of one uploaded file, computed as its
+    chunks go by."""
+
+    def __init__(self, filename: str, content_type: str):
+        self.filename = filename
+        self.content_type = content_type
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.head = b""
+
+    def write(self, data):
+        if len(self.head) < SNIFF_SIZE:
+            self.head += bytes(data[: SNIFF_SIZE - len(self.head)])
+        self.sha256.update(data)
+        self.size += len(data)
+
+    async def flush(self, final: bool = False):
+        pass
+
+    def close(self):
+        pass
+
+    def discard(self):
+        pass
+
+    def result(self) -> dict:
+        return {
+            "name": self.filename,
+            "type": self.content_type,
+            "size": self.size,
+            "sha256": self.sha256.hexdigest(),
+            "detected_type": sniff_type(self.head),
+        }
+
+
+class MemoryBudget:
+    """Caps the bytes held by uploads in flight; uploads over the budget wait
+    (and so stop reading from their sockets) until others finish."""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.available = total
+        self.condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def reserve(self, size: int):
+        size = min(size, self.total)
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.available >= size)
+            self.available -= size
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.available += size
+                self.condition.notify_all()
+
+
+MAX_HEADER_SIZE = 16 * 1024
+# Bytes accepted after the closing boundary; they are counted, not kept
+MAX_EPILOGUE_SIZE = 64 * 1024
+PREAMBLE, BOUNDARY, HEADERS, DATA, END = range(5)
+
+
+def parse_part_headers(block: bytes) -> dict[bytes, bytes]:
+    headers = {}
+    for line in block.split(b"\r\n"):
+        name, _, value = line.partition(b":")
+        headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+async def analyse_multipart(content_type: str, stream, field: str, file_factory=FileAnalysis):
+    """Parse a multipart body straight off ``stream`` and feed the parts of
+    ``field`` to ``file_factory(filename, content_type)`` objects without
+    spooling them anywhere. Returns the objects of the file parts received.
+
+    Part data is located with ``bytes.find`` on the delimiter, so large
+    uploads go through at close to hashing speed. ``flush`` is awaited after
+    every chunk read and once more, with ``final=True``, when a part ends.
+    """
+    mime_type, params = parse_options_header(content_type)
+    if mime_type != b"multipart/form-data" or not params.get(b"boundary"):
+        raise UploadError("expected a multipart/form-data body")
+    delimiter = b"\r\n--" + params[b"boundary"]
+    keep = len(delimiter) - 1
+
+    files = []
+    current = None
+    state = PREAMBLE
+    # The leading CRLF lets the first boundary match the same delimiter
+    buffer = b"\r\n"
+    epilogue = 0
+    try:
+        async for chunk in stream:
+            if state == END:
+                epilogue += len(chunk)
+                if epilogue > MAX_EPILOGUE_SIZE:
+                    raise UploadError("multipart epilogue too large")
+                continue
+            buffer += chunk
+            while state != END:
+                if state == PREAMBLE:
+                    pos = buffer.find(delimiter)
+                    if pos == -1:
+                        buffer = buffer[-keep:]
+                        break
+                    buffer = buffer[pos + len(delimiter):]
+                    state = BOUNDARY
+                elif state == BOUNDARY:
+                    if len(buffer) < 2:
+                        break
+                    if buffer.startswith(b"--"):
+                        epilogue = len(buffer) - 2
+                        if epilogue > MAX_EPILOGUE_SIZE:
+                            raise UploadError("multipart epilogue too large")
+                        buffer = b""
+                        state = END
+                    elif buffer.startswith(b"\r\n"):
+                        buffer = buffer[2:]
+                        state = HEADERS
+                    else:
+                        raise UploadError("malformed multipart body")
+                elif state == HEADERS:
+                    if buffer.startswith(b"\r\n"):
+                        headers = {}
+                        buffer = buffer[2:]
+                    else:
+                        pos = buffer.find(b"\r\n\r\n")
+                        if pos == -1:
+                            if len(buffer) > MAX_HEADER_SIZE:
+                                raise UploadError("multipart part headers too large")
+                            break
+                        headers = parse_part_headers(buffer[:pos])
+                        buffer = buffer[pos + 4:]
+                    current = None
+                    _, options = parse_options_header(headers.get(b"content-disposition", b""))
+                    filename = options.get(b"filename", b"")
+                    if options.get(b"name", b"").decode("latin-1") == field and filename:
+                        current = file_factory(
+                            filename.decode("utf-8", "replace"),
+                            headers.get(b"content-type", b"").decode("latin-1"),
+                        )
+                        files.append(current)
+                    state = DATA
+                elif state == DATA:
+                    pos = buffer.find(delimiter)
+                    if pos == -1:
+                        # Hold back a possible partial delimiter at the end
+                        if len(buffer) > keep:
+                            if current is not None:
+                                current.write(memoryview(buffer)[:-keep])
+                            buffer = buffer[-keep:]
+                        break
+                    if current is not None:
+                        current.write(memoryview(buffer)[:pos])
+                        await current.flush(final=True)
+                        current.close()
+                    buffer = buffer[pos + len(delimiter):]
+                    state = BOUNDARY
+            if current is not None:
+                await current.flush()
+        if state != END:
+            raise UploadError("truncated multipart body")
+    except BaseException:
+        for file in files:
+            file.discard()
+        raise
+    return files
@@ -0,0 +1,81 @@
+import ipaddress
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+SCHEMES = {"http": 80, "https": 443, "ftp": 21}
+MAX_URL_LENGTH = 2048
+
+# Checked before parsing: no whitespace, control characters or backslashes
+# (browsers treat "\" like "/", which urlsplit does not)
+UNSAFE_CHARS = re.compile(r"[\x00-\x20\x7f\\]")
+HOST_LABEL = re.compile(r"(?!-)[a-z0-9-]{1,63}(?<!-)")
+TLD = re.compile(r"[a-z]{2,63}|xn--[a-z0-9-]{1,59}")
+
+
+def valid_hostname(host: str) -> bool:
+    if host == "localhost":
+        return True
+    labels = host.split(".")
+    if len(host) > 253 or len(labels) < 2:
+        return False
+    return TLD.fullmatch(labels[-1]) is not None and all(
+        HOST_LABEL.fullmatch(label) for label in labels
+    )
+
+
+def normalize_host(host: str) -> str | None:
+    if host.startswith("["):
+        try:
+            return f"[{ipaddress.IPv6Address(host[1:-1]).compressed}]"
+        except ValueError:
+            return None
+    host = host.rstrip(".").lower()
+    if host.replace(".", "").isdigit():
+        try:
+            return str(ipaddress.IPv4Address(host))
+        except ValueError:
+            return None
+    if not host.isascii():
+        try:
+            host = host.encode("idna").decode("ascii")
+        except UnicodeError:
+            return None
+    return host if valid_hostname(host) else None
+
+
+def normalize_url(url: str) -> str | None:
+    """Return the canonical form of ``url``, or None if it isn't a valid
+    absolute http(s)/ftp URL.
+
+    Scheme and host are lowercased, default ports dropped and an empty path
+    becomes "/", so equivalent spellings of a link map to the same string.
+    """
+    if len(url) > MAX_URL_LENGTH or UNSAFE_CHARS.search(url):
+        return None
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return None
+
+    scheme = parts.scheme.lower()
+    if scheme not in SCHEMES or not url[len(scheme) + 1:].startswith("//"):
+        return None
+
+    netloc = parts.netloc
+    userinfo, _, hostport = netloc.rpartition("@")
+    if hostport.startswith("["):
+        host = hostport[: hostport.find("]") + 1]
+    else:
+        host = hostport.partition(":")[0]
+    if not host:
+        return None
+    host = normalize_host(host)
+    if host is None:
+        return None
+
+    netloc = f"{userinfo}@{host}" if userinfo else host
+    if port is not None and port != SCHEMES[scheme]:
+        netloc = f"{netloc}:{port}"
+
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, parts.fragment))
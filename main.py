@@ -1,17 +1,29 @@
+import json
 from datetime import datetime, timezone
-import validators as v
+import config
 from database import create_db_and_tables, engine
+from helpers.bulk import parse_ndjson, stream_json_array, stream_ndjson
+from helpers.clicks import ClickCounter
+from helpers.filestore import SHA256_HEX, ContentStore, RangeFileResponse
+from helpers.compression import CompressionMiddleware
+from helpers.headers import MAX_USER_AGENT, client_ip, parse_accept_language, parse_networks, parse_user_agent
+from helpers.http_cache import ETagMiddleware, etag_matches, redirect_cache_control
+from helpers.profiling import ProfilingMiddleware, RouteProfiler, make_router
 from helpers.timestamp import get_date_from_str, make_res
+from helpers.shorturl import shorten_and_commit
+from helpers.uploads import FileAnalysis, MemoryBudget, UploadError, analyse_multipart
+from helpers.urls import normalize_url
 from uvicorn import run
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI, Request, Form, File, UploadFile
+from fastapi import FastAPI, Request, Form
 from sqlmodel import Session, select
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
 from fastapi.responses import RedirectResponse
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 
-from models import Hero, User, Url, Exercise
+from models import Hero, User, Url, Exercise, StoredBlob, StoredUpload
 
 from sqlmodel.sql.expression import Select, SelectOfScalar
 
@@ -27,13 +39,38 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ETagMiddleware)
+if config.compression != "off":
+  app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=config.compression_minimum_size,
+    gzip_level=config.gzip_level,
+    brotli_quality=config.brotli_quality,
+    prefer_brotli=config.compression == "br",
+  )
+if config.profiling_token:
+  profiler = RouteProfiler()
+  profiler.routes = app.routes
+  app.add_middleware(ProfilingMiddleware, profiler=profiler)
+  app.include_router(make_router(profiler, config.profiling_token))
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
+clicks = ClickCounter(
+  engine, interval=config.click_flush_interval, max_referrers=config.click_max_referrers
+)
+upload_budget = MemoryBudget(config.upload_memory_budget)
+trusted_proxies = parse_networks(config.trusted_proxies)
+file_store = ContentStore(config.upload_store) if config.upload_store else None
 
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
     create_db_and_tables()
+    clicks.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await clicks.stop()
 
 @app.get('/')
 async def root():
@@ -61,10 +98,14 @@ async def timestamp(date: str):
 async def whoami(request: Request):
   headers = request.headers
   client = request.client
+  language = headers.get("accept-language", "")
+  software = headers.get("user-agent", "")
   return {
-    "ipaddress": client.host,
-    "language": headers["accept-language"],
-    "software": headers["user-agent"],
+    "ipaddress": client_ip(client.host if client else "", headers.get("x-forwarded-for"), trusted_proxies),
+    "language": language,
+    "software": software,
+    "languages": parse_accept_language(language),
+    "user_agent": parse_user_agent(software[:MAX_USER_AGENT]),
   }
 
 
@@ -74,26 +115,59 @@ async def render_shorturl_page(request: Request):
 
 @app.post('/api/shorturl')
 async def post_shorturl(url: str = Form()):
-  if not v.url(url):
+  url = normalize_url(url)
+  if url is None:
     return {'error': 'invalid url'}
   
-  with Session(engine) as session:
-        urls = session.exec(select(Url)).all()
-        original_urls = list(map(lambda url: url.original_url, urls))
-        if url in original_urls:
-          return session.get(Url, url)
-        else:
-          url = Url(short_url=(len(urls) + 1), original_url=url)
-          session.add(url)
-          session.commit()
-          session.refresh(url)
-          return url
+  # Waits for any bulk batch allocating ids, so not on the event loop
+  short_url = (await run_in_threadpool(shorten_and_commit, engine, [url]))[url]
+  return {"original_url": url, "short_url": short_url}
+
+def shorten_bulk(items):
+  urls = [normalize_url(item) if isinstance(item, str) else None for item in items]
+  return urls, shorten_and_commit(engine, [url for url in urls if url is not None])
+
+@app.post('/api/shorturl/bulk')
+async def post_shorturl_bulk(request: Request):
+  ndjson = request.headers.get("content-type", "").startswith("application/x-ndjson")
+  body = await request.body()
+  try:
+    items = parse_ndjson(body) if ndjson else json.loads(body)
+  except ValueError:
+    return JSONResponse({"error": "invalid body"}, status_code=400)
+  if not isinstance(items, list):
+    return JSONResponse({"error": "expected a list of urls"}, status_code=400)
+
+  # Large batches take seconds; keep them off the event loop
+  urls, short_urls = await run_in_threadpool(shorten_bulk, items)
+  results = (
+    {"original_url": url, "short_url": short_urls[url]} if url is not None
+    else {"error": "invalid url", "url": item}
+    for item, url in zip(items, urls)
+  )
+  if ndjson:
+    return StreamingResponse(stream_ndjson(results), media_type="application/x-ndjson")
+  return StreamingResponse(stream_json_array(results), media_type="application/json")
 
 @app.get('/api/shorturl/{id}')
-async def get_shorturl(id: int):
+async def get_shorturl(id: int, request: Request):
   with Session(engine) as session:
     url = session.exec(select(Url).where(Url.short_url==id)).first()
-    return RedirectResponse(url.original_url, status_code=303)
+    if url is None:
+      return JSONResponse({"error": "No short URL found for the given input"}, status_code=404)
+    clicks.record(id, request.headers.get("referer"))
+    status_code = config.shorturl_redirect_status
+    return RedirectResponse(
+      url.original_url,
+      status_code=status_code,
+      headers={
+        "Cache-Control": redirect_cache_control(status_code, config.shorturl_cache_max_age)
+      },
+    )
+
+@app.get('/api/shorturl/{id}/stats')
+async def get_shorturl_stats(id: int):
+  return clicks.stats(id)
     
     
 @app.get("/api/exercise-tracker", response_class=HTMLResponse)
@@ -189,15 +263,67 @@ async def get_file(request: Request):
   )
 
 @app.post("/api/fileanalyse")
-async def create_upload_file(upfile: UploadFile | None = None):
-  if not upfile:
+async def create_upload_file(request: Request):
+  def open_file(filename, content_type):
+    if file_store is None:
+      return FileAnalysis(filename, content_type)
+    return file_store.open_upload(
+      filename, content_type, expected_sha256=request.headers.get("x-content-sha256")
+    )
+
+  content_length = int(request.headers.get("content-length") or config.upload_window)
+  async with upload_budget.reserve(min(content_length, config.upload_window)):
+    try:
+      files = await analyse_multipart(
+        request.headers.get("content-type", ""), request.stream(), "upfile", open_file
+      )
+    except UploadError as error:
+      return JSONResponse({"error": str(error)}, status_code=400)
+  if not files:
     return {"message": "No upload file sent"}
-  else:
-    return {
-      "name": upfile.filename,
-      "type": upfile.content_type,
-      "size": upfile.spool_max_size,
-    }
+
+  upfile = files[0]
+  for extra in files[1:]:
+    extra.discard()
+  result = upfile.result()
+  if file_store is None:
+    return result
+
+  try:
+    sha256 = await run_in_threadpool(upfile.commit)
+  except UploadError as error:
+    return JSONResponse({"error": str(error)}, status_code=400)
+  with Session(engine) as session:
+    if session.get(StoredBlob, sha256) is None:
+      session.add(StoredBlob(sha256=sha256, size=upfile.size, detected_type=result["detected_type"]))
+    session.add(StoredUpload(sha256=sha256, filename=upfile.filename, content_type=upfile.content_type))
+    session.commit()
+  result["duplicate"] = upfile.duplicate
+  result["url"] = f"/api/files/{sha256}"
+  return result
+
+@app.api_route("/api/files/{sha256}", methods=["GET", "HEAD"])
+async def download_file(sha256: str, request: Request):
+  if file_store is None or not SHA256_HEX.fullmatch(sha256) or not file_store.exists(sha256):
+    return JSONResponse({"error": "file not found"}, status_code=404)
+
+  etag = f'"{sha256}"'
+  headers = {"etag": etag, "cache-control": "public, max-age=31536000, immutable"}
+  if etag_matches(request.headers.get("if-none-match", ""), etag):
+    return Response(status_code=304, headers=headers)
+
+  with Session(engine) as session:
+    blob = session.get(StoredBlob, sha256)
+    upload = session.exec(
+      select(StoredUpload).where(StoredUpload.sha256 == sha256).order_by(StoredUpload.id.desc())
+    ).first()
+  return RangeFileResponse(
+    file_store.path(sha256),
+    media_type=(upload and upload.content_type) or (blob and blob.detected_type) or "application/octet-stream",
+    filename=upload.filename if upload else None,
+    method=request.method,
+    headers=headers,
+  )
 
 
 @app.post("/heroes/")
@@ -1,9 +1,12 @@
 from datetime import datetime
 from typing import Union
 from sqlmodel import Field, Relationship, SQLModel
-# from sqlalchemy import UniqueConstraint
+from sqlalchemy import UniqueConstraint
 
 class Url(SQLModel, table=True):
+  # Also serves as the index for short url lookups
+  __table_args__ = (UniqueConstraint("short_url"),)
+
   short_url: int
   original_url: str = Field(default=..., primary_key=True)
 
@@ -26,4 +29,27 @@ class Exercise(SQLModel, table=True):
   date: str
 
   user_id: int | None = Field(default=None, foreign_key="user.id")
-  user: User | None = Relationship(back_populates="exercises")
\ No newline at end of file
+  user: User | None = Relationship(back_populates="exercises")
+
+class UrlClick(SQLModel, table=True):
+  short_url: int = Field(primary_key=True)
+  hour: int = Field(primary_key=True)
+  referrer: str = Field(default="", primary_key=True)
+  clicks: int = 0
+
+class StoredBlob(SQLModel, table=True):
+  sha256: str = Field(primary_key=True)
+  size: int
+  detected_type: str
+  created_at: datetime = Field(default_factory=datetime.utcnow)
+
+  uploads: list["StoredUpload"] = Relationship(back_populates="blob")
+
+class StoredUpload(SQLModel, table=True):
+  id: Union[int, None] = Field(default=None, primary_key=True)
+  filename: str
+  content_type: str
+  uploaded_at: datetime = Field(default_factory=datetime.utcnow)
+
+  sha256: str = Field(foreign_key="storedblob.sha256", index=True)
+  blob: StoredBlob | None = Relationship(back_populates="uploads")
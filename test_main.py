@@ -1,6 +1,11 @@
+import hashlib
+import json
+import os
+import pytest
 from datetime import datetime, timezone
 from fastapi.testclient import TestClient
 
+import config
 from main import app
 
 client = TestClient(app)
@@ -586,3 +591,574 @@ def test_users_id_logs_limit():
         raise Exception(f"{response.status_code} {response.text}")
     else:
       raise Exception(f"{response.status_code} {response.text}")
+
+
+#  ===========================================================================================================
+# HTTP compression and caching
+# Large JSON responses are compressed when the client accepts gzip.
+def test_gzip_large_response():
+  for _ in range(20):
+    client.post(
+      "/api/users",
+      headers={"Content-Type": "application/x-www-form-urlencoded"},
+      data=f"username=fcc_test_{datetime.timestamp(datetime.now())}"[:28],
+    )
+  response = client.get("/api/users", headers={"Accept-Encoding": "gzip"})
+  assert response.ok
+  assert response.headers["content-encoding"] == "gzip"
+  assert "Accept-Encoding" in response.headers["vary"]
+  assert isinstance(response.json(), list)
+
+# Small responses are sent as is.
+def test_small_response_not_compressed():
+  response = client.get("/", headers={"Accept-Encoding": "gzip"})
+  assert response.ok
+  assert "content-encoding" not in response.headers
+
+# A GET with a matching If-None-Match gets an empty 304 response.
+def test_etag_not_modified():
+  response = client.get("/timestamp/api/2016-12-25")
+  assert response.ok
+  etag = response.headers["etag"]
+  cached_response = client.get("/timestamp/api/2016-12-25", headers={"If-None-Match": etag})
+  assert cached_response.status_code == 304
+  assert cached_response.headers["etag"] == etag
+  assert cached_response.content == b""
+
+# Short url redirects carry a Cache-Control header so they can be cached at the edge.
+def test_shorturl_redirect_cache_control():
+  url_variable = round(datetime.now().replace(tzinfo=timezone.utc).timestamp() * 1000)
+  post_response = client.post(
+    '/api/shorturl',
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'},
+    data=f"url=http://localhost:8000/?cache={url_variable}"
+  )
+  short_url = post_response.json()["short_url"]
+  get_response = client.get(f"/api/shorturl/{short_url}", allow_redirects=False)
+  assert get_response.status_code == 303
+  assert get_response.headers["cache-control"].startswith("public, max-age=")
+
+# Short url clicks are counted and reported by the stats endpoint.
+def test_shorturl_stats():
+  url_variable = round(datetime.now().replace(tzinfo=timezone.utc).timestamp() * 1000)
+  post_response = client.post(
+    '/api/shorturl',
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'},
+    data=f"url=http://localhost:8000/?stats={url_variable}"
+  )
+  short_url = post_response.json()["short_url"]
+  client.get(f"/api/shorturl/{short_url}", allow_redirects=False)
+  client.get(
+    f"/api/shorturl/{short_url}",
+    headers={"Referer": "https://www.freecodecamp.org/learn"},
+    allow_redirects=False,
+  )
+  stats_response = client.get(f"/api/shorturl/{short_url}/stats")
+  assert stats_response.ok
+  stats = stats_response.json()
+  assert stats["clicks"] >= 2
+  assert stats["referrers"]["www.freecodecamp.org"] >= 1
+  assert sum(stats["hourly"].values()) == stats["clicks"]
+
+  from main import clicks
+  clicks.flush()
+  assert client.get(f"/api/shorturl/{short_url}/stats").json() == stats
+
+# Equivalent spellings of a URL (scheme/host case, default port, empty path) get the same short url.
+def test_post_shorturl_normalized():
+  url_variable = round(datetime.now().replace(tzinfo=timezone.utc).timestamp() * 1000)
+  short_urls = set()
+  for spelling in (
+    f"http://example.com/?n={url_variable}",
+    f"HTTP://Example.COM:80/?n={url_variable}",
+  ):
+    response = client.post(
+      "/api/shorturl",
+      headers={"Content-Type": "application/x-www-form-urlencoded"},
+      data={"url": spelling},
+    )
+    assert response.json()["original_url"] == f"http://example.com/?n={url_variable}"
+    short_urls.add(response.json()["short_url"])
+  assert len(short_urls) == 1
+
+# Non-web schemes and malformed hosts are rejected.
+def test_url_validation_rejects_unsafe():
+  for url in ("javascript:alert(1)", "http://exa mple.com", "http://-bad-.com", "https://999.1.1.1/"):
+    response = client.post(
+      "/api/shorturl",
+      headers={"Content-Type": "application/x-www-form-urlencoded"},
+      data={"url": url},
+    )
+    assert response.json() == {"error": "invalid url"}
+
+# A JSON list of urls can be shortened in one request; results come back in input order.
+def test_post_shorturl_bulk():
+  url_variable = round(datetime.now().replace(tzinfo=timezone.utc).timestamp() * 1000)
+  urls = [
+    f"http://example.com/bulk/{url_variable}/1",
+    "not a url",
+    f"HTTP://EXAMPLE.com/bulk/{url_variable}/1",
+    f"http://example.com/bulk/{url_variable}/2",
+  ]
+  response = client.post("/api/shorturl/bulk", json=urls)
+  assert response.ok
+  results = response.json()
+  assert len(results) == 4
+  assert results[0]["original_url"] == urls[0]
+  assert results[1] == {"error": "invalid url", "url": "not a url"}
+  assert results[2]["short_url"] == results[0]["short_url"]
+  assert results[3]["short_url"] != results[0]["short_url"]
+
+  single_response = client.post(
+    "/api/shorturl",
+    headers={"Content-Type": "application/x-www-form-urlencoded"},
+    data={"url": urls[3]},
+  )
+  assert single_response.json()["short_url"] == results[3]["short_url"]
+
+# NDJSON in, NDJSON out.
+def test_post_shorturl_bulk_ndjson():
+  url_variable = round(datetime.now().replace(tzinfo=timezone.utc).timestamp() * 1000)
+  body = f'"http://example.com/ndjson/{url_variable}"\nhttp://example.com/ndjson/{url_variable}/2\n'
+  response = client.post(
+    "/api/shorturl/bulk",
+    headers={"Content-Type": "application/x-ndjson"},
+    data=body,
+  )
+  assert response.ok
+  lines = [json.loads(line) for line in response.text.splitlines()]
+  assert [line["original_url"] for line in lines] == [
+    f"http://example.com/ndjson/{url_variable}",
+    f"http://example.com/ndjson/{url_variable}/2",
+  ]
+
+# Short urls exported to a snapshot file redirect from the database-free edge app.
+def test_edge_snapshot_redirect(tmp_path):
+  import edge
+  from database import engine
+  from helpers.snapshot import SnapshotStore, export_snapshot
+
+  url_variable = round(datetime.now().replace(tzinfo=timezone.utc).timestamp() * 1000)
+  post_response = client.post(
+    '/api/shorturl',
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'},
+    data=f"url=http://localhost:8000/?edge={url_variable}"
+  )
+  short_url = post_response.json()["short_url"]
+
+  path = str(tmp_path / "urls.snapshot")
+  export_snapshot(engine, path)
+  edge.snapshots = SnapshotStore(path, interval=0)
+  edge_client = TestClient(edge.app)
+
+  response = edge_client.get(f"/api/shorturl/{short_url}", allow_redirects=False)
+  assert response.status_code == 303
+  assert response.headers["location"] == f"http://localhost:8000/?edge={url_variable}"
+  assert edge_client.get(f"/api/shorturl/{short_url + 1000000}").status_code == 404
+
+  new_response = client.post(
+    '/api/shorturl',
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'},
+    data={"url": f"http://localhost:8000/?edge={url_variable}&new=1"}
+  )
+  export_snapshot(engine, path)
+  # The new snapshot is loaded in the background, started by the next request
+  new_short_url = new_response.json()['short_url']
+  edge_client.get(f"/api/shorturl/{new_short_url}", allow_redirects=False)
+  edge.snapshots.reloader.join()
+  response = edge_client.get(f"/api/shorturl/{new_short_url}", allow_redirects=False)
+  assert response.headers["location"] == f"http://localhost:8000/?edge={url_variable}&new=1"
+
+#  ===========================================================================================================
+# Profiling
+# The profiling endpoints only exist when PROFILING_TOKEN is set.
+def test_profiling_disabled_by_default():
+  if config.profiling_token:
+    pytest.skip("PROFILING_TOKEN is set")
+  response = client.get("/admin/profile/sample?seconds=1")
+  assert response.status_code == 404
+
+# Route profiling and stack sampling, on an app with profiling enabled.
+def test_profiling_route_and_sample():
+  from fastapi import FastAPI
+  from helpers.profiling import ProfilingMiddleware, RouteProfiler, make_router
+
+  profiled_app = FastAPI()
+
+  @profiled_app.get("/work/{n}")
+  async def work(n: int):
+    return {"total": sum(range(n))}
+
+  profiler = RouteProfiler()
+  profiler.routes = profiled_app.routes
+  profiled_app.add_middleware(ProfilingMiddleware, profiler=profiler)
+  profiled_app.include_router(make_router(profiler, "secret"))
+  profiled_client = TestClient(profiled_app)
+  admin = {"X-Admin-Token": "secret"}
+
+  assert profiled_client.post("/admin/profile/route?path=/work/{n}&requests=2").status_code == 403
+  # Non-ASCII tokens are refused like any other wrong token
+  wrong = {"X-Admin-Token": "sécret"}
+  assert profiled_client.post("/admin/profile/route?path=/work/{n}&requests=2", headers=wrong).status_code == 403
+  assert profiled_client.post("/admin/profile/route?path=/work/{n}&requests=2", headers=admin).ok
+  profiled_client.get("/work/1000")
+  assert profiled_client.get("/admin/profile/route?path=/work/{n}", headers=admin).json()["remaining"] == 1
+  profiled_client.get("/work/1000")
+  report = profiled_client.get("/admin/profile/route?path=/work/{n}", headers=admin)
+  assert report.ok
+  assert "function calls" in report.text
+
+  sample = profiled_client.get("/admin/profile/sample?seconds=0.1", headers=admin)
+  assert sample.ok
+  assert all(line.rsplit(" ", 1)[1].isdigit() for line in sample.text.splitlines())
+
+# Other tasks running while a profiled request awaits are not charged to it.
+def test_profiling_excludes_other_tasks():
+  import asyncio
+  import cProfile
+  import pstats
+  from helpers.profiling import StepProfiled
+
+  def other_work():
+    return sum(range(1000))
+
+  async def other_task():
+    for _ in range(10):
+      other_work()
+      await asyncio.sleep(0)
+
+  async def profiled():
+    await asyncio.sleep(0.01)
+    return "done"
+
+  async def main():
+    profile = cProfile.Profile()
+    other = asyncio.create_task(other_task())
+    result = await StepProfiled(profiled(), profile)
+    await other
+    return result, pstats.Stats(profile)
+
+  result, stats = asyncio.run(main())
+  assert result == "done"
+  names = {name for _, _, name in stats.stats}
+  assert "profiled" in names
+  assert "other_work" not in names
+
+#  ===========================================================================================================
+# File metadata
+# Uploading a file returns its name, type, size, SHA-256 and sniffed type.
+def test_fileanalyse():
+  content = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4000
+  response = client.post(
+    "/api/fileanalyse",
+    files={"upfile": ("image.png", content, "image/png")},
+  )
+  assert response.ok
+  assert response.json() == {
+    "name": "image.png",
+    "type": "image/png",
+    "size": len(content),
+    "sha256": hashlib.sha256(content).hexdigest(),
+    "detected_type": "image/png",
+  }
+
+# Without a file the api says so.
+def test_fileanalyse_no_file():
+  response = client.post("/api/fileanalyse", files={"other": ("a.txt", b"hello", "text/plain")})
+  assert response.json() == {"message": "No upload file sent"}
+  response = client.post("/api/fileanalyse", data={"upfile": "not a file"})
+  assert response.status_code == 400
+
+# The streaming multipart parser copes with delimiters split across chunks.
+def test_analyse_multipart_small_chunks():
+  import asyncio
+  from helpers.uploads import analyse_multipart
+
+  content = b"line one\r\n--almost-a-boundary\r\nline two"
+  body = (
+    b"--xyz\r\n"
+    b'Content-Disposition: form-data; name="note"\r\n\r\n'
+    b"hello\r\n--xyz\r\n"
+    b'Content-Disposition: form-data; name="upfile"; filename="a.txt"\r\n'
+    b"Content-Type: text/plain\r\n\r\n" + content + b"\r\n--xyz--\r\n"
+  )
+
+  async def one_byte_chunks():
+    for i in range(len(body)):
+      yield body[i:i + 1]
+
+  files = asyncio.run(analyse_multipart("multipart/form-data; boundary=xyz", one_byte_chunks(), "upfile"))
+  assert len(files) == 1
+  result = files[0].result()
+  assert result["size"] == len(content)
+  assert result["sha256"] == hashlib.sha256(content).hexdigest()
+  assert result["detected_type"] == "text/plain"
+
+# Data after the closing boundary is ignored, not buffered, and refused once it gets large.
+def test_analyse_multipart_epilogue():
+  import asyncio
+  import time
+  from helpers.uploads import MAX_EPILOGUE_SIZE, UploadError, analyse_multipart
+
+  body = (
+    b"--xyz\r\n"
+    b'Content-Disposition: form-data; name="upfile"; filename="a.txt"\r\n\r\n'
+    b"hello\r\n--xyz--\r\n"
+  )
+
+  async def chunks(epilogue_chunks, trailer=b""):
+    yield body + trailer
+    for _ in range(epilogue_chunks):
+      yield b"x" * 65536
+
+  files = asyncio.run(analyse_multipart("multipart/form-data; boundary=xyz", chunks(0), "upfile"))
+  assert files[0].result()["size"] == 5
+  files = asyncio.run(analyse_multipart("multipart/form-data; boundary=xyz", chunks(MAX_EPILOGUE_SIZE // 65536 - 1), "upfile"))
+  assert files[0].result()["size"] == 5
+
+  start = time.perf_counter()
+  with pytest.raises(UploadError):
+    asyncio.run(analyse_multipart("multipart/form-data; boundary=xyz", chunks(1600), "upfile"))
+  with pytest.raises(UploadError):
+    asyncio.run(analyse_multipart("multipart/form-data; boundary=xyz", chunks(0, b"x" * 10 ** 6), "upfile"))
+  assert time.perf_counter() - start < 1
+
+  response = client.post(
+    "/api/fileanalyse",
+    headers={"Content-Type": "multipart/form-data; boundary=xyz"},
+    data=body + b"x" * 10 ** 6,
+  )
+  assert response.status_code == 400
+
+# Stored uploads are written in batches by worker threads, not on the event loop.
+def test_stored_file_writes_off_loop(tmp_path, monkeypatch):
+  import asyncio
+  import threading
+  from helpers import filestore
+  from helpers.uploads import analyse_multipart
+
+  monkeypatch.setattr(filestore, "WRITE_BATCH", 1000)
+  store = filestore.ContentStore(str(tmp_path))
+  content = os.urandom(10000)
+  body = (
+    b"--xyz\r\n"
+    b'Content-Disposition: form-data; name="upfile"; filename="a.bin"\r\n\r\n'
+    + content + b"\r\n--xyz--\r\n"
+  )
+  loop_thread = threading.get_ident()
+  write_threads = []
+
+  def open_upload(filename, content_type):
+    upload = store.open_upload(filename, content_type)
+    writelines = upload.file.writelines
+    def record_writelines(lines):
+      write_threads.append(threading.get_ident())
+      writelines(lines)
+    upload.file.writelines = record_writelines
+    return upload
+
+  async def chunks():
+    for i in range(0, len(body), 300):
+      yield body[i:i + 300]
+
+  files = asyncio.run(analyse_multipart("multipart/form-data; boundary=xyz", chunks(), "upfile", open_upload))
+  sha256 = files[0].commit()
+  assert len(write_threads) > 1
+  assert loop_thread not in write_threads
+  with open(store.path(sha256), "rb") as stored:
+    assert stored.read() == content
+
+# With a store configured, uploads are kept once per content and can be downloaded, in ranges too.
+def test_fileanalyse_store(tmp_path, monkeypatch):
+  import main
+  from helpers.filestore import ContentStore
+
+  monkeypatch.setattr(main, "file_store", ContentStore(str(tmp_path)))
+  content = f"stored at {datetime.now()}\n".encode() * 1000
+  sha256 = hashlib.sha256(content).hexdigest()
+
+  first = client.post("/api/fileanalyse", files={"upfile": ("a.txt", content, "text/plain")}).json()
+  assert first["sha256"] == sha256
+  assert first["duplicate"] is False
+  assert first["url"] == f"/api/files/{sha256}"
+  second = client.post("/api/fileanalyse", files={"upfile": ("b.txt", content, "text/plain")}).json()
+  assert second["duplicate"] is True
+  assert os.listdir(tmp_path / "tmp") == []
+
+  # A client that sends the digest up front has its copy recognised without writing it
+  early = client.post(
+    "/api/fileanalyse",
+    headers={"X-Content-SHA256": sha256},
+    files={"upfile": ("c.txt", content, "text/plain")},
+  ).json()
+  assert early["duplicate"] is True
+  lying = client.post(
+    "/api/fileanalyse",
+    headers={"X-Content-SHA256": sha256},
+    files={"upfile": ("d.txt", b"something else", "text/plain")},
+  )
+  assert lying.status_code == 400
+
+  assert client.head(first["url"]).status_code == 200
+  download = client.get(first["url"])
+  assert download.content == content
+  assert download.headers["etag"] == f'"{sha256}"'
+  assert client.get(first["url"], headers={"If-None-Match": f'"{sha256}"'}).status_code == 304
+
+  partial = client.get(first["url"], headers={"Range": "bytes=10-19"})
+  assert partial.status_code == 206
+  assert partial.content == content[10:20]
+  assert partial.headers["content-range"] == f"bytes 10-19/{len(content)}"
+  assert client.get(first["url"], headers={"Range": f"bytes={len(content)}-"}).status_code == 416
+  assert client.get(f"/api/files/{'0' * 64}").status_code == 404
+
+# whoami parses the language preferences and User-Agent, and works without either header.
+def test_whoami_parsed():
+  response = client.get(
+    "/api/whoami",
+    headers={
+      "Accept-Language": "fr-CH, fr;q=0.9, en;q=0.8, de;q=0.7, *;q=0",
+      "User-Agent": "Mozilla/5.0 (iPhone; CPU iPhone OS 16_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.5 Mobile/15E148 Safari/604.1",
+    },
+  )
+  response_json = response.json()
+  assert [language["tag"] for language in response_json["languages"]] == ["fr-CH", "fr", "en", "de"]
+  assert response_json["user_agent"] == {
+    "family": "Safari",
+    "version": "16.5",
+    "os": "iOS",
+    "os_version": "16.5",
+    "device": "mobile",
+  }
+
+  bare = TestClient(app)
+  bare.headers.clear()
+  response = bare.get("/api/whoami")
+  assert response.ok
+  assert response.json()["language"] == ""
+
+# Bots are recognised by name, and long User-Agents don't take long to parse.
+def test_parse_user_agent_bots():
+  import time
+  from helpers.headers import find_bot, parse_user_agent
+
+  googlebot = parse_user_agent("Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)")
+  assert (googlebot["family"], googlebot["version"], googlebot["device"]) == ("Googlebot", "2.1", "bot")
+  assert find_bot("Mozilla/5.0 (compatible; YandexSpider-Images; Linux)") == ("YandexSpider-Images", None)
+  assert find_bot("Mozilla/5.0 (X11; Linux x86_64) Firefox/115.0") is None
+
+  start = time.perf_counter()
+  assert find_bot("a" * 8000 + " bot") == ("bot", None)
+  assert find_bot("-" * 100000 + "crawler/1.0") == ("-" * 100000 + "crawler", "1.0")
+  parse_user_agent("a" * 100000 + " bot")
+  assert time.perf_counter() - start < 0.5
+
+# X-Forwarded-For is only believed when the peer is a trusted proxy.
+def test_whoami_forwarded_for():
+  from helpers.headers import client_ip, parse_networks
+
+  response = client.get("/api/whoami", headers={"X-Forwarded-For": "203.0.113.7"})
+  assert response.json()["ipaddress"] == "testclient"
+
+  trusted = parse_networks("10.0.0.0/8, 192.0.2.1")
+  forwarded_for = "203.0.113.7, 198.51.100.2, 10.1.2.3"
+  assert client_ip("10.0.0.1", forwarded_for, trusted) == "198.51.100.2"
+  assert client_ip("192.0.2.1", "unknown", trusted) == "192.0.2.1"
+  assert client_ip("198.51.100.9", forwarded_for, trusted) == "198.51.100.9"
+
+# Unknown short urls are a 404 and aren't counted; a malformed Referer doesn't break the redirect.
+def test_shorturl_unknown_and_bad_referer():
+  from main import clicks
+
+  unknown = 10 ** 12
+  response = client.get(f"/api/shorturl/{unknown}", allow_redirects=False)
+  assert response.status_code == 404
+  assert clicks.stats(unknown)["clicks"] == 0
+
+  url_variable = round(datetime.now().replace(tzinfo=timezone.utc).timestamp() * 1000)
+  post_response = client.post(
+    '/api/shorturl',
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'},
+    data=f"url=http://localhost:8000/?referer={url_variable}"
+  )
+  short_url = post_response.json()["short_url"]
+  response = client.get(f"/api/shorturl/{short_url}", headers={"Referer": "http://[bad/"}, allow_redirects=False)
+  assert response.status_code == 303
+  assert clicks.stats(short_url)["referrers"] == {"direct": 1}
+
+# Each short url keeps a bounded number of referrer hosts per hour; the rest count as "other".
+def test_click_referrers_bounded():
+  from helpers.clicks import ClickCounter
+
+  counter = ClickCounter(engine=None, max_referrers=3)
+  for i in range(100):
+    counter.record(1, f"http://host{i}.example/")
+  counter.record(1, "http://host0.example/page")
+  counter.record(2, "http://host99.example/")
+  assert len(counter.pending) == 5
+  hosts = {host: clicks for (code, _, host), clicks in counter.pending.items() if code == 1}
+  assert hosts == {"host0.example": 2, "host1.example": 1, "host2.example": 1, "other": 97}
+
+# Bulk batches posted in parallel all succeed and agree on the ids of shared urls.
+def test_post_shorturl_bulk_concurrent():
+  from concurrent.futures import ThreadPoolExecutor
+
+  stamp = round(datetime.now().timestamp() * 1000000)
+  shared = [f"http://shared-{stamp}-{j}.example/" for j in range(100)]
+
+  def post_batch(i):
+    batch = [f"http://batch-{stamp}-{i}-{j}.example/" for j in range(1000)] + shared
+    response = client.post("/api/shorturl/bulk", json=batch)
+    assert response.status_code == 200
+    return response.json()
+
+  with ThreadPoolExecutor(4) as pool:
+    results = list(pool.map(post_batch, range(8)))
+  assert all(results[0][-100:] == result[-100:] for result in results)
+  ids = {item["short_url"] for result in results for item in result}
+  assert len(ids) == 8 * 1000 + 100
+
+# Empty batches and batches with nothing valid in them are answered, not a 500.
+def test_post_shorturl_bulk_nothing_valid():
+  response = client.post("/api/shorturl/bulk", json=[])
+  assert response.ok
+  assert response.json() == []
+  response = client.post("/api/shorturl/bulk", json=["nope", 5])
+  assert response.ok
+  assert response.json() == [{"error": "invalid url", "url": "nope"}, {"error": "invalid url", "url": 5}]
+
+# Corrupt or truncated snapshots are rejected, and a store keeps serving the last good one.
+def test_snapshot_corrupt(tmp_path):
+  import struct
+  from database import engine
+  from helpers.snapshot import Snapshot, SnapshotStore, export_snapshot
+
+  client.post(
+    '/api/shorturl',
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'},
+    data={"url": "http://localhost:8000/?corrupt=1"}
+  )
+  path = tmp_path / "urls.snapshot"
+  export_snapshot(engine, str(path))
+  good = path.read_bytes()
+  store = SnapshotStore(str(path), interval=0)
+  short_url = store.snapshot.ids[0]
+  expected = store.lookup(short_url)
+
+  inflated = good[:8] + struct.pack("<Q", 10 ** 6) + good[16:]
+  for corrupt in (b"", good[:10], good[:-1], good + b"x", inflated, b"NOTASNAP" + good[8:]):
+    bad = tmp_path / "bad.snapshot"
+    bad.write_bytes(corrupt)
+    with pytest.raises(ValueError):
+      Snapshot(str(bad))
+    os.replace(bad, path)
+    store.lookup(short_url)
+    store.reloader.join()
+    assert store.lookup(short_url) == expected
+
+  from array import array
+  from helpers.snapshot import is_increasing
+  assert is_increasing(array("Q", range(100000)), strict=True)
+  assert is_increasing(array("Q", [0, 0, 1]), strict=False)
+  assert not is_increasing(array("Q", [0, 0, 1]), strict=True)
+  assert not is_increasing(array("Q", list(range(100000)) + [5]), strict=False)